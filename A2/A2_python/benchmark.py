@@ -0,0 +1,409 @@
+"""Benchmarks for the highway call simulation.
+
+    python benchmark.py run --output current.json
+    python benchmark.py compare baseline.json current.json --tolerance 0.1
+    python benchmark.py check
+
+`run` times micro-benchmarks (event push/pop, admission decisions, variate
+generation) and macro runs of every policy at several loads and cell counts,
+each over REPLICATIONS fixed seeds with the median rate kept. `compare` exits
+non-zero when macro throughput drops by more than the tolerance, or when the
+blocked/dropped proportions of a workload differ significantly (Welch t-test
+over the replications) between the baseline and current results, e.g. before
+and after an engine change. Engine variants within one run (plain /
+instrumented) share their seeds and hence their counts, so they are not
+compared with each other. Micro-benchmark changes are only reported unless
+--micro-tolerance is given: they run for milliseconds and move together by
+tens of percent between runs on a busy machine. `check` verifies that a
+checkpointed run resumes bit-for-bit and that what-if branches restored with
+their own random streams diverge right after the snapshot.
+"""
+import argparse
+import importlib
+import json
+import os
+import platform
+import sys
+import tempfile
+from contextlib import contextmanager
+from heapq import heappop
+from math import isnan
+from statistics import median
+from time import perf_counter
+
+from numpy.random import default_rng
+from scipy.stats import ttest_ind
+
+import simulation
+from checkpoint import load_checkpoint, restore, save_checkpoint, snapshot
+from instrumentation import Instrumentation
+
+POLICIES = {
+    "no_reservation": "2_simulate",
+    "static_reservation": "3_simulate_static_reservation",
+    "dynamic_reservation": "4_simulate_dynamical_reservation",
+}
+# SCALED_UP values, see the simulation scripts
+LOADS = (1.0, 0.9)
+CELLS = (10, 20)
+ENGINES = ("plain", "instrumented")
+
+SEED = 5233
+DURATION = 100  # unit: hour
+# replications per macro workload, seeds SEED, SEED + 1, ...
+REPLICATIONS = 5
+TOLERANCE = 0.1
+ALPHA = 0.001
+
+
+def load_policy(policy):
+    return importlib.import_module(POLICIES[policy])
+
+
+@contextmanager
+def configured(seed, scaled_up=None, cells=None):
+    # the simulation keeps its parameters as module globals
+    names = ("rng", "SCALED_UP", "NUM_STATIONS", "STATION_SCALING")
+    saved = {name: getattr(simulation, name) for name in names}
+    simulation.rng = default_rng(seed)
+    if scaled_up is not None:
+        simulation.SCALED_UP = scaled_up
+    if cells is not None:
+        simulation.NUM_STATIONS = cells
+        simulation.STATION_SCALING = 20 / cells
+    try:
+        yield
+    finally:
+        for name, value in saved.items():
+            setattr(simulation, name, value)
+
+
+def median_rate(fn, number, repeat=5, blocks=5):
+    # operations per second over the median of repeat x blocks timed blocks,
+    # each running number / blocks operations; a single fastest run is too
+    # noisy to gate on
+    size = number // blocks
+    elapsed = []
+    for _ in range(repeat):
+        for _ in range(blocks):
+            started = perf_counter()
+            fn(size)
+            elapsed.append(perf_counter() - started)
+    return size / median(elapsed)
+
+
+def bench_push_pop(module):
+    system = module.System()
+
+    def run(number):
+        system.event_queue.clear()
+        for i in range(number):
+            system.push_event((i * 7919) % number, {"type": "end"})
+        while system.event_queue:
+            heappop(system.event_queue)
+
+    return median_rate(run, 100_000)
+
+
+def busy_system(module, occupied):
+    # one cell with `occupied` channels taken, alternating new / handover calls
+    system = module.System()
+    system.channels[0] = {
+        channel: {"since": 0, "handover": channel % 2 == 1}
+        for channel in range(occupied)
+    }
+    return system
+
+
+def bench_admission(module, handler, occupied):
+    system = busy_system(module, occupied)
+    handle = getattr(system, handler)
+
+    def run(number):
+        for _ in range(number):
+            handle(0)
+
+    return median_rate(run, 200_000)
+
+
+def bench_variate(name):
+    generate = getattr(simulation, name)
+
+    def run(number):
+        for _ in range(number):
+            generate()
+
+    return median_rate(run, 200_000)
+
+
+def bench_generate_calls(module):
+    system = module.System()
+    batch = simulation.ARRIVAL_BATCH
+
+    def run(number):
+        for _ in range(number // batch):
+            system.generate_calls(batch)
+
+    return median_rate(run, 50 * batch)
+
+
+def run_micro(seed):
+    results = {}
+    base = load_policy("no_reservation")
+    with configured(seed):
+        results["event_push_pop"] = bench_push_pop(base)
+        for name in ("generate_interval", "generate_location", "generate_duration", "generate_speed"):
+            results[f"variate/{name}"] = bench_variate(name)
+        results["variate/generate_calls"] = bench_generate_calls(base)
+    for policy in POLICIES:
+        module = load_policy(policy)
+        with configured(seed):
+            for handler in ("handle_initiate", "handle_handover"):
+                for occupied in (0, 5, 9):
+                    results[f"{policy}/{handler}/occupied={occupied}"] = bench_admission(
+                        module, handler, occupied
+                    )
+    return {name: {"ops_per_second": rate} for name, rate in results.items()}
+
+
+def run_replication(module, engine, duration):
+    instrument = Instrumentation() if engine == "instrumented" else None
+    system = module.System(instrument)
+    started = perf_counter()
+    while not system.is_time_up(duration):
+        system.deliver_next_event()
+    wall = perf_counter() - started
+    events = system.event_id - len(system.event_queue)
+    return {
+        "events": events,
+        "wall_seconds": wall,
+        "events_per_second": events / wall,
+        "total": system.successful_call + system.blocked_call + system.dropped_call,
+        "blocked": system.blocked_call,
+        "dropped": system.dropped_call,
+    }
+
+
+def run_macro(seed, duration, engines, replications, loads=LOADS, cells=CELLS):
+    results = {}
+    for policy in POLICIES:
+        module = load_policy(policy)
+        for scaled_up in loads:
+            for num_cells in cells:
+                for engine in engines:
+                    runs = []
+                    for r in range(replications):
+                        with configured(seed + r, scaled_up, num_cells):
+                            runs.append(
+                                {"seed": seed + r, **run_replication(module, engine, duration * 3600)}
+                            )
+                    key = workload_key(policy, scaled_up, num_cells, engine)
+                    results[key] = {
+                        "policy": policy,
+                        "scaled_up": scaled_up,
+                        "cells": num_cells,
+                        "engine": engine,
+                        # a single timed run is too noisy to gate on
+                        "events_per_second": median(run["events_per_second"] for run in runs),
+                        "total": sum(run["total"] for run in runs),
+                        "blocked": sum(run["blocked"] for run in runs),
+                        "dropped": sum(run["dropped"] for run in runs),
+                        "replications": runs,
+                    }
+                    print(
+                        f"{key}: {results[key]['events_per_second']:.0f} events/s (median) "
+                        f"blocked: {results[key]['blocked']} dropped: {results[key]['dropped']}",
+                        file=sys.stderr,
+                    )
+    return results
+
+
+def workload_key(policy, scaled_up, cells, engine):
+    return f"{policy}/scaled_up={scaled_up}/cells={cells}/{engine}"
+
+
+def welch_p_value(a, b):
+    # blocked / dropped calls cluster in busy periods, so the spread is taken
+    # from the replications rather than assumed binomial
+    if a == b:
+        return 1.0
+    p = ttest_ind(a, b, equal_var=False).pvalue
+    # nan: both without spread, yet different
+    return 0.0 if isnan(p) else p
+
+
+def throughput_regressions(baseline, current, tolerance, micro_tolerance=None):
+    # a None tolerance reports the section without gating on it
+    failures = []
+    for section, metric, limit in (
+        ("micro", "ops_per_second", micro_tolerance),
+        ("macro", "events_per_second", tolerance),
+    ):
+        for name, old in baseline.get(section, {}).items():
+            new = current.get(section, {}).get(name)
+            if new is None:
+                continue
+            change = new[metric] / old[metric] - 1
+            if limit is None:
+                flag = "info"
+            elif change < -limit:
+                flag = "REGRESSION"
+                failures.append(name)
+            else:
+                flag = "ok"
+            print(f"{flag:<10} {name}: {old[metric]:.0f} -> {new[metric]:.0f} ({change:+.1%})")
+    return failures
+
+
+def proportions(result, counter):
+    return [run[counter] / run["total"] for run in result["replications"]]
+
+
+def equivalence_failures(baseline, current, alpha):
+    failures = []
+    for key, a in baseline.get("macro", {}).items():
+        b = current.get("macro", {}).get(key)
+        if b is None:
+            continue
+        if min(len(a["replications"]), len(b["replications"])) < 2:
+            print(f"skipped {key}: equivalence needs at least 2 replications per side")
+            continue
+        for counter in ("blocked", "dropped"):
+            p = welch_p_value(proportions(a, counter), proportions(b, counter))
+            if p < alpha:
+                print(f"NOT EQUIVALENT {key} {counter}: baseline vs current (p={p:.2g})")
+                failures.append(f"{key}/{counter}")
+    return failures
+
+
+def run_until(system, time_limit):
+    while not system.is_time_up(time_limit):
+        system.deliver_next_event()
+    return system
+
+
+def checkpoint_failures(seed, policy="no_reservation"):
+    module = load_policy(policy)
+    failures = []
+    with configured(seed):
+        straight = run_until(module.System(), 7200)
+        reference = snapshot(straight, simulation.rng)
+
+    with configured(seed):
+        data = snapshot(run_until(module.System(), 3600), simulation.rng)
+    with configured(seed + 1):
+        resumed = restore(data, module.System, simulation.rng)
+        run_until(resumed, 7200)
+        if snapshot(resumed, simulation.rng) != reference:
+            failures.append("resume is not bit-for-bit identical")
+
+    # what-if branches must draw their calls from their own streams at once
+    arrivals = []
+    for branch_seed in (seed + 1, seed + 2):
+        with configured(branch_seed):
+            branch = restore(data, module.System, simulation.rng, restore_rng=False)
+            run_until(branch, 3600 + 60)
+            arrivals.append([instant for instant, _ in branch.arrivals[:16]])
+    if arrivals[0] == arrivals[1]:
+        failures.append("branches with different seeds replay the same arrivals")
+    if min(arrivals[0][0], arrivals[1][0]) >= 3600 + 60:
+        failures.append("branches do not draw new arrivals right after the snapshot")
+
+    # a checkpoint resumes only under the policy and parameters that wrote it
+    with tempfile.TemporaryDirectory() as directory, configured(seed):
+        path = os.path.join(directory, "replication_0.ckpt")
+        save_checkpoint(path, run_until(module.System(), 3600), simulation.rng)
+        other = load_policy(next(name for name in POLICIES if name != policy))
+        for label, system_cls, scaled_up in (
+            ("another policy", other.System, None),
+            ("another load", module.System, 0.9),
+        ):
+            with configured(seed, scaled_up):
+                try:
+                    load_checkpoint(path, system_cls, simulation.rng)
+                except ValueError:
+                    continue
+            failures.append(f"checkpoint resumed under {label}")
+
+    for failure in failures:
+        print(f"FAILED {failure}")
+    return failures
+
+
+def command_check(args):
+    failures = checkpoint_failures(args.seed)
+    if failures:
+        return 1
+    print("all checks passed")
+    return 0
+
+
+def command_run(args):
+    engines = args.engines.split(",")
+    for engine in engines:
+        if engine not in ENGINES:
+            raise SystemExit(f"unknown engine {engine!r}, expected one of {ENGINES}")
+    results = {
+        "python": platform.python_version(),
+        "seed": args.seed,
+        "duration": args.duration,
+        "replications": args.replications,
+        "micro": run_micro(args.seed),
+        "macro": {}
+        if args.skip_macro
+        else run_macro(args.seed, args.duration, engines, args.replications),
+    }
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+    return 0
+
+
+def command_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    failures = throughput_regressions(
+        baseline, current, args.tolerance, args.micro_tolerance
+    )
+    failures += equivalence_failures(baseline, current, args.alpha)
+    if failures:
+        print(f"{len(failures)} check(s) failed")
+        return 1
+    print("all checks passed")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run = commands.add_parser("run", help="run the benchmarks and save JSON results")
+    run.add_argument("--output", default="benchmark.json")
+    run.add_argument("--seed", type=int, default=SEED)
+    run.add_argument("--duration", type=float, default=DURATION, help="unit: hour")
+    run.add_argument("--engines", default="plain", help=f"comma separated, from {ENGINES}")
+    run.add_argument("--replications", type=int, default=REPLICATIONS)
+    run.add_argument("--skip-macro", action="store_true")
+    run.set_defaults(handler=command_run)
+
+    compare = commands.add_parser("compare", help="compare two JSON results")
+    compare.add_argument("baseline")
+    compare.add_argument("current")
+    compare.add_argument("--tolerance", type=float, default=TOLERANCE)
+    compare.add_argument(
+        "--micro-tolerance", type=float, help="gate micro-benchmarks too, e.g. 0.5"
+    )
+    compare.add_argument("--alpha", type=float, default=ALPHA)
+    compare.set_defaults(handler=command_compare)
+
+    check = commands.add_parser("check", help="check checkpoint resume and branching")
+    check.add_argument("--seed", type=int, default=SEED)
+    check.set_defaults(handler=command_check)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
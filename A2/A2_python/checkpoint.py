@@ -0,0 +1,104 @@
+import os
+import pickle
+import zlib
+
+# System attributes that make up the simulation state
+STATE = (
+    "channels",
+    "event_queue",
+    "event_id",
+    "now",
+    "blocked_call",
+    "dropped_call",
+    "successful_call",
+    "metrics",
+    "arrivals",
+    "next_arrival",
+)
+
+
+def snapshot(system, rng):
+    """Compressed binary snapshot of the system and the generator feeding it."""
+    state = {name: getattr(system, name) for name in STATE}
+    state["rng"] = rng.bit_generator.state
+    state["config"] = system.config()
+    return zlib.compress(pickle.dumps(state, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+def _rebuild(data, system_cls, rng, instrument, restore_rng, check_config=False):
+    state = pickle.loads(zlib.decompress(data))
+    config = state.pop("config")
+    expected = system_cls.config()
+    if check_config and config != expected:
+        # name => (checkpoint value, current value)
+        mismatch = {
+            name: (config.get(name), expected.get(name))
+            for name in config.keys() | expected.keys()
+            if config.get(name) != expected.get(name)
+        }
+        raise ValueError(f"checkpoint written with a different configuration: {mismatch}")
+    rng_state = state.pop("rng")
+    if restore_rng:
+        rng.bit_generator.state = rng_state
+
+    # skip __init__, it would schedule a fresh first call
+    system = system_cls.__new__(system_cls)
+    for name, value in state.items():
+        setattr(system, name, value)
+    system._use_instrument(instrument)
+    return system
+
+
+def restore(data, system_cls, rng, instrument=None, restore_rng=True, metrics_dir=None):
+    """Start a new run from snapshot() output.
+
+    The generator state is put back into `rng` so the run continues exactly
+    as it would have. Pass restore_rng=False to branch a what-if run off a
+    warmed-up snapshot with the caller's own random stream instead.
+    Metrics keep their counters but stream to `metrics_dir`, or nowhere if
+    it is None, never into the files of the run the snapshot came from.
+    """
+    system = _rebuild(data, system_cls, rng, instrument, restore_rng)
+    if not restore_rng:
+        # calls pre-drawn from the parent's stream would be replayed first
+        system.arrivals = []
+        system.next_arrival = 0
+    if system.metrics is not None:
+        system.metrics.redirect(metrics_dir)
+    return system
+
+
+def save_checkpoint(path, system, rng):
+    # write then rename, so a kill mid-write leaves the previous checkpoint
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(snapshot(system, rng))
+    os.replace(tmp_path, path)
+
+
+def load_checkpoint(path, system_cls, rng, instrument=None):
+    """Resume the run that wrote the checkpoint at `path`.
+
+    Metrics keep streaming to that run's files, minus the rows written after
+    the checkpoint. Raises ValueError if the checkpoint was written by another
+    policy or with other simulation parameters, see System.config(). To
+    branch off a checkpoint file instead, pass its bytes to restore().
+    """
+    with open(path, "rb") as f:
+        system = _rebuild(
+            f.read(), system_cls, rng, instrument, restore_rng=True, check_config=True
+        )
+    if system.metrics is not None:
+        system.metrics.resume()
+    return system
+
+
+def run_with_checkpoints(system, rng, time_limit, path, interval):
+    """Deliver events up to time_limit, checkpointing every `interval`
+    simulated seconds; the last checkpoint is taken at time_limit."""
+    checkpoint_at = system.now
+    while not system.is_time_up(time_limit):
+        checkpoint_at = min(checkpoint_at + interval, time_limit)
+        while not system.is_time_up(checkpoint_at):
+            system.deliver_next_event()
+        save_checkpoint(path, system, rng)
@@ -0,0 +1,92 @@
+import cProfile
+import io
+import pstats
+from contextlib import contextmanager
+from time import perf_counter
+
+
+class Instrumentation:
+    """Hot-path counters for System.deliver_next_event.
+
+    Passing an instance to System(instrument=...) makes the system use its
+    instrumented event loop; without it the plain loop runs and nothing here
+    is touched.
+    """
+
+    def __init__(self):
+        # event type => number of delivered events
+        self.counts = {"initiate": 0, "handover": 0, "end": 0}
+        # event type => cumulative handler time, unit: second (wall clock)
+        self.handler_time = {"initiate": 0.0, "handover": 0.0, "end": 0.0}
+        self.peak_queue_length = 0
+        self.wall_start = None
+        self.sim_start = None
+        self.system = None
+
+    def attach(self, system):
+        self.system = system
+        self.sim_start = system.now
+        self.wall_start = perf_counter()
+
+    def record(self, event_type, elapsed, queue_length):
+        self.counts[event_type] += 1
+        self.handler_time[event_type] += elapsed
+        if queue_length > self.peak_queue_length:
+            self.peak_queue_length = queue_length
+
+    def summary(self):
+        wall = perf_counter() - self.wall_start
+        events = sum(self.counts.values())
+        simulated = self.system.now - self.sim_start
+        return {
+            "events": events,
+            "counts": dict(self.counts),
+            "handler_time": dict(self.handler_time),
+            "peak_queue_length": self.peak_queue_length,
+            "wall_seconds": wall,
+            "events_per_second": events / wall if wall > 0 else 0.0,
+            "sim_seconds_per_wall_second": simulated / wall if wall > 0 else 0.0,
+        }
+
+    def report(self):
+        summary = self.summary()
+        lines = [
+            f"events: {summary['events']} in {summary['wall_seconds']:.2f}s "
+            f"({summary['events_per_second']:.0f} events/s, "
+            f"{summary['sim_seconds_per_wall_second']:.0f} sim-s/wall-s, "
+            f"peak queue {summary['peak_queue_length']})"
+        ]
+        for event_type, count in summary["counts"].items():
+            elapsed = summary["handler_time"][event_type]
+            per_event = elapsed / count * 1e6 if count else 0.0
+            lines.append(
+                f"  {event_type:<8} {count:>9} events {elapsed:8.3f}s {per_event:6.2f}us/event"
+            )
+        return "\n".join(lines)
+
+
+@contextmanager
+def profiling(profiler=None, sort="cumulative", limit=20):
+    """Profile the enclosed block, e.g. one replication.
+
+    Uses cProfile by default. Any sampling profiler exposing start()/stop()
+    (pyinstrument's Profiler, for instance) can be passed in instead; its
+    output is left to the caller.
+    """
+    if profiler is None:
+        profiler = cProfile.Profile()
+    if hasattr(profiler, "enable"):
+        profiler.enable()
+        try:
+            yield profiler
+        finally:
+            profiler.disable()
+            stream = io.StringIO()
+            pstats.Stats(profiler, stream=stream).sort_stats(sort).print_stats(limit)
+            print(stream.getvalue())
+    else:
+        profiler.start()
+        try:
+            yield profiler
+        finally:
+            profiler.stop()
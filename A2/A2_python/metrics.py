@@ -0,0 +1,246 @@
+import json
+import os
+
+import numpy as np
+
+
+class Welford:
+    """Running mean / variance in O(1) memory."""
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+
+    def add(self, x):
+        self.count += 1
+        delta = x - self.mean
+        self.mean += delta / self.count
+        self.m2 += delta * (x - self.mean)
+
+    @property
+    def variance(self):
+        return self.m2 / (self.count - 1) if self.count > 1 else 0.0
+
+    def summary(self):
+        return {"count": self.count, "mean": self.mean, "variance": self.variance}
+
+
+class Histogram:
+    """Fixed-width bins over [low, high), plus underflow / overflow counts."""
+
+    def __init__(self, low, high, bins):
+        self.low = low
+        self.high = high
+        self.width = (high - low) / bins
+        self.counts = [0] * bins
+        self.underflow = 0
+        self.overflow = 0
+
+    def add(self, x):
+        if x < self.low:
+            self.underflow += 1
+        elif x >= self.high:
+            self.overflow += 1
+        else:
+            self.counts[int((x - self.low) / self.width)] += 1
+
+    def summary(self):
+        return {
+            "low": self.low,
+            "high": self.high,
+            "counts": self.counts,
+            "underflow": self.underflow,
+            "overflow": self.overflow,
+        }
+
+
+class ColumnWriter:
+    """Appends equally long columns to one raw binary file per column.
+
+    `schema.json` in the directory lists the column names and dtypes, see
+    read_columns() for loading the result.
+    """
+
+    def __init__(self, directory, columns):
+        # columns: list of (name, dtype) pairs
+        self.directory = directory
+        self.columns = [(name, np.dtype(dtype).str) for name, dtype in columns]
+        self.rows = 0
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, "schema.json"), "w") as f:
+            json.dump({"columns": self.columns}, f)
+        for name, _ in self.columns:
+            open(self.column_path(name), "wb").close()
+
+    def column_path(self, name):
+        return os.path.join(self.directory, f"{name}.bin")
+
+    def write(self, arrays):
+        for (name, dtype), array in zip(self.columns, arrays):
+            with open(self.column_path(name), "ab") as f:
+                np.asarray(array, dtype=dtype).tofile(f)
+        self.rows += len(arrays[0])
+
+    def resume(self):
+        """Continue writing files left by a run resumed from a checkpoint.
+
+        Rows written after the checkpoint was taken are dropped. Raises
+        ValueError if a file is missing or shorter than the checkpoint says.
+        """
+        sizes = {name: self.rows * np.dtype(dtype).itemsize for name, dtype in self.columns}
+        for name, size in sizes.items():
+            path = self.column_path(name)
+            if not os.path.exists(path) or os.path.getsize(path) < size:
+                raise ValueError(f"{path} holds fewer than the {self.rows} rows of the checkpoint")
+        for name, size in sizes.items():
+            with open(self.column_path(name), "r+b") as f:
+                f.truncate(size)
+
+
+def read_columns(directory):
+    with open(os.path.join(directory, "schema.json")) as f:
+        columns = json.load(f)["columns"]
+    return {
+        name: np.fromfile(os.path.join(directory, f"{name}.bin"), dtype=dtype)
+        for name, dtype in columns
+    }
+
+
+class Metrics:
+    """Online per-cell statistics fed by the System event handlers.
+
+    Memory stays constant in the simulated duration: counters, Welford
+    accumulators and histograms are fixed size, and channel occupancy is
+    sampled every `interval` seconds into a ring buffer of `capacity` rows
+    that is flushed to a ColumnWriter when full (or dropped if there is no
+    directory to stream to).
+    """
+
+    def __init__(self, num_cells, directory=None, interval=60, capacity=1024, now=0):
+        self.num_cells = num_cells
+
+        self.blocked = [0] * num_cells
+        self.dropped = [0] * num_cells
+        self.handover_in = [0] * num_cells
+        # channels in use and their time integral, for the time-average occupancy
+        self.occupancy = [0] * num_cells
+        self.occupancy_area = [0.0] * num_cells
+        self.last_change = [now] * num_cells
+        self.start = now
+
+        # time a call holds a channel in one cell, unit: second
+        self.channel_holding = [Welford() for _ in range(num_cells)]
+        # time from call initiation to its end or drop, unit: second
+        self.call_holding = Welford()
+        self.call_holding_histogram = Histogram(0, 1800, 180)
+
+        self.interval = interval
+        self.next_sample = now + interval
+        self.ring = np.zeros((capacity, num_cells + 1))
+        self.ring_rows = 0
+        self.writer = None
+        self.redirect(directory)
+
+    def redirect(self, directory):
+        """Stream from now on to a fresh `directory`, or nowhere if None.
+
+        Used for runs branched off a snapshot so they never write into the
+        files of the run the snapshot was taken from. Samples still in the
+        ring buffer go to the new files.
+        """
+        self.directory = directory
+        self.writer = None
+        if directory is not None:
+            columns = [("time", "f8")] + [(f"cell_{c}", "i2") for c in range(self.num_cells)]
+            self.writer = ColumnWriter(os.path.join(directory, "occupancy"), columns)
+
+    def resume(self):
+        # same run continued from a checkpoint, see ColumnWriter.resume
+        if self.writer is not None:
+            self.writer.resume()
+
+    def sample(self, now):
+        # occupancy is constant between events, so every boundary passed
+        # since the last event sees the current occupancy
+        while self.next_sample <= now:
+            row = self.ring[self.ring_rows]
+            row[0] = self.next_sample
+            row[1:] = self.occupancy
+            self.ring_rows += 1
+            if self.ring_rows == len(self.ring):
+                self.flush()
+            self.next_sample += self.interval
+
+    def flush(self):
+        if self.writer is not None and self.ring_rows:
+            rows = self.ring[: self.ring_rows]
+            self.writer.write([rows[:, 0]] + [rows[:, c + 1] for c in range(self.num_cells)])
+        self.ring_rows = 0
+
+    def occupy(self, now, cell, change):
+        self.occupancy_area[cell] += self.occupancy[cell] * (now - self.last_change[cell])
+        self.last_change[cell] = now
+        self.occupancy[cell] += change
+
+    def release(self, now, cell, call):
+        self.occupy(now, cell, -1)
+        self.channel_holding[cell].add(now - call["since"])
+
+    def on_initiate(self, now, cell, admitted):
+        if now >= self.next_sample:
+            self.sample(now)
+        if admitted:
+            self.occupy(now, cell, 1)
+        else:
+            self.blocked[cell] += 1
+
+    def on_handover(self, now, from_cell, to_cell, call, admitted):
+        if now >= self.next_sample:
+            self.sample(now)
+        self.release(now, from_cell, call)
+        if admitted:
+            self.handover_in[to_cell] += 1
+            self.occupy(now, to_cell, 1)
+        else:
+            self.dropped[to_cell] += 1
+            self.finish_call(now, call)
+
+    def on_end(self, now, cell, call):
+        if now >= self.next_sample:
+            self.sample(now)
+        self.release(now, cell, call)
+        self.finish_call(now, call)
+
+    def finish_call(self, now, call):
+        holding = now - call["start"]
+        self.call_holding.add(holding)
+        self.call_holding_histogram.add(holding)
+
+    def summary(self, now):
+        elapsed = now - self.start
+        mean_occupancy = [
+            (area + occupancy * (now - last)) / elapsed if elapsed > 0 else 0.0
+            for area, occupancy, last in zip(
+                self.occupancy_area, self.occupancy, self.last_change
+            )
+        ]
+        return {
+            "blocked": self.blocked,
+            "dropped": self.dropped,
+            "handover_in": self.handover_in,
+            "mean_occupancy": mean_occupancy,
+            "channel_holding": [w.summary() for w in self.channel_holding],
+            "call_holding": self.call_holding.summary(),
+            "call_holding_histogram": self.call_holding_histogram.summary(),
+        }
+
+    def close(self, now):
+        """Flush the remaining samples and write summary.json."""
+        self.sample(now)
+        self.flush()
+        summary = self.summary(now)
+        if self.directory is not None:
+            with open(os.path.join(self.directory, "summary.json"), "w") as f:
+                json.dump(summary, f, indent=2)
+        return summary
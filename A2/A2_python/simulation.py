@@ -0,0 +1,341 @@
+"""Highway cellular network simulation shared by the policy scripts.
+
+A policy script subclasses System with its own handle_initiate and
+handle_handover, then hands the class to main().
+"""
+import inspect
+import os
+from contextlib import nullcontext
+from heapq import heappop, heappush
+from time import perf_counter
+from numpy.random import default_rng
+import numpy as np
+import statistics as stat
+from scipy.stats import t
+
+from checkpoint import load_checkpoint, run_with_checkpoints
+from instrumentation import Instrumentation, profiling
+from metrics import Metrics
+
+NUM_STATIONS = 20
+STATION_SCALING = 20/NUM_STATIONS
+
+# SCALED_UP = 1 indicates the base level network traffic
+# SCALED_UP < 1 indicates ((1-SCALED_UP)*100)% increased network traffic
+SCALED_UP = 1
+# DIRECTIONS = 1: all cars travel from cell 0 towards the last cell
+# DIRECTIONS = 2: two carriageways with the arrival rate above each,
+# half of the calls travel back towards cell 0
+DIRECTIONS = 1
+rng = default_rng()
+
+
+# unit: second
+def generate_interval(size=None):
+    return rng.exponential(scale=1.35*SCALED_UP*STATION_SCALING/DIRECTIONS, size=size)
+
+
+# call arrival location relative to entrance of highway, i.e. 0KM of cell 0
+# unit: km
+def generate_location(size=None):
+    return rng.uniform(low=0, high=2*NUM_STATIONS, size=size)
+
+
+# unit: second
+def generate_duration(size=None):
+    return rng.exponential(scale=120, size=size)
+
+
+# unit: km/h
+def generate_speed(size=None):
+    return rng.normal(loc=90, scale=8.22, size=size)
+
+
+# +1: towards the last cell, -1: towards cell 0
+def generate_direction(size):
+    if DIRECTIONS == 1:
+        return np.ones(size, dtype=int)
+    return np.where(rng.random(size) < 0.5, 1, -1)
+
+
+SIM_DURATION = 100 * 3600  # unit: second
+ARRIVAL_BATCH = 1024  # calls drawn and scheduled at once
+
+# opt-in hot-path counters / cProfile report for every replication
+INSTRUMENT = False
+PROFILE = False
+
+# set to a directory to checkpoint every replication and resume it after a kill
+CHECKPOINT_DIR = None
+CHECKPOINT_INTERVAL = 3600  # unit: simulated second
+
+# set to a directory to stream per-cell occupancy and statistics of every replication
+METRICS_DIR = None
+METRICS_INTERVAL = 60  # unit: simulated second
+
+
+class System:
+    def __init__(self, instrument=None, metrics=None):
+        # per cell, channel id => call record mapping, channel id in range [0, 10)
+        self.channels = [{} for _ in range(NUM_STATIONS)]
+        # priority queue of event, i.e. (instant, event id, dict) tuple
+        self.event_queue = []
+        self.event_id = 0
+        # unit: second
+        self.now = 0
+
+        self.blocked_call = 0
+        self.dropped_call = 0
+        self.successful_call = 0
+
+        # pre-drawn (instant, initiate event) pairs, see generate_calls
+        self.arrivals = []
+        self.next_arrival = 0
+
+        # optional online statistics, see metrics.Metrics
+        self.metrics = metrics
+
+        self._use_instrument(instrument)
+
+        self.generate_call()
+
+    def _use_instrument(self, instrument):
+        # the event loop is chosen once here, the plain one pays nothing
+        self.instrument = instrument
+        if instrument is not None:
+            self.deliver_next_event = self.deliver_next_event_instrumented
+            instrument.attach(self)
+
+    @classmethod
+    def policy_name(cls):
+        # the script name, which __module__ is not when the script runs as __main__
+        return os.path.splitext(os.path.basename(inspect.getfile(cls)))[0]
+
+    @classmethod
+    def config(cls):
+        # what a checkpoint must have been written with to be resumed by cls
+        return {
+            "policy": f"{cls.policy_name()}.{cls.__qualname__}",
+            "SCALED_UP": SCALED_UP,
+            "NUM_STATIONS": NUM_STATIONS,
+            "STATION_SCALING": STATION_SCALING,
+            "DIRECTIONS": DIRECTIONS,
+            "SIM_DURATION": SIM_DURATION,
+        }
+
+    # the two handle methods are the policy, implemented by the scripts
+    # return channel id to allocate the channel to the call
+    # return None to block/drop the call
+
+    def handle_initiate(self, cell):
+        raise NotImplementedError
+
+    def handle_handover(self, cell):
+        raise NotImplementedError
+
+    def push_event(self, after_duration, event):
+        self.event_id += 1
+        heappush(self.event_queue, (self.now + after_duration, self.event_id, event))
+        return self.event_id
+
+    def push_event_at(self, instant, event):
+        self.event_id += 1
+        heappush(self.event_queue, (instant, self.event_id, event))
+        return self.event_id
+
+    def generate_calls(self, size):
+        # draw `size` consecutive calls and precompute their whole trajectory,
+        # i.e. the instant of every cell crossing and of the call end
+        interval = generate_interval(size)  # second
+        location = generate_location(size)  # km
+        duration = generate_duration(size)  # second
+        speed = generate_speed(size) / 3600  # km/second
+        direction = generate_direction(size)
+
+        instant = self.now + np.cumsum(interval)
+        cell = (location // 2).astype(int)
+        # time to the first cell boundary ahead, then per whole cell
+        first = np.where(direction > 0, 2 - location % 2, location % 2) / speed
+        cell_time = 2 / speed
+        # cells left ahead before leaving the highway
+        remaining = np.where(direction > 0, NUM_STATIONS - 1 - cell, cell)
+        # a boundary reached strictly before the call ends is a handover
+        handovers = np.clip(np.ceil((duration - first) / cell_time), 0, remaining).astype(int)
+        end_at = instant + np.minimum(duration, first + remaining * cell_time)
+
+        # handover instants of all calls back to back, call i owns handovers[i] of them
+        stops = np.cumsum(handovers)
+        owner = np.repeat(np.arange(size), handovers)
+        step = np.arange(stops[-1]) - np.repeat(stops - handovers, handovers)
+        crossing = (instant[owner] + first[owner] + step * cell_time[owner]).tolist()
+
+        # one record per call, queued again for each of its events
+        self.arrivals = [
+            (
+                arrival,
+                {
+                    "type": "initiate",
+                    "cell": c,
+                    "direction": d,
+                    "handovers": crossing[stop - n : stop],
+                    "index": 0,
+                    "end_at": e,
+                },
+            )
+            for arrival, c, d, n, stop, e in zip(
+                instant.tolist(),
+                cell.tolist(),
+                direction.tolist(),
+                handovers.tolist(),
+                stops.tolist(),
+                end_at.tolist(),
+            )
+        ]
+        self.next_arrival = 0
+
+    def generate_call(self):
+        if self.next_arrival == len(self.arrivals):
+            self.generate_calls(ARRIVAL_BATCH)
+        instant, initiate = self.arrivals[self.next_arrival]
+        self.next_arrival += 1
+        self.push_event_at(instant, initiate)
+
+    def on_initiate(self, call):
+        self.generate_call()
+
+        cell = call["cell"]
+        assert 0 <= cell < NUM_STATIONS
+
+        channel = self.handle_initiate(cell)
+        if self.metrics is not None:
+            self.metrics.on_initiate(self.now, cell, channel is not None)
+        if channel is None:
+            self.blocked_call += 1
+            return
+
+        assert 0 <= channel < 10
+        assert channel not in self.channels[cell]
+        call["channel"] = channel
+        call["since"] = self.now
+        call["start"] = self.now
+        call["handover"] = False
+        self.channels[cell][channel] = call
+
+        self.push_next_event_for_call(call)
+
+    def push_next_event_for_call(self, call):
+        # the trajectory is precomputed, just step to its next entry
+        index = call["index"]
+        handovers = call["handovers"]
+        if index < len(handovers):
+            call["type"] = "handover"
+            call["index"] = index + 1
+            self.push_event_at(handovers[index], call)
+        else:
+            call["type"] = "end"
+            self.push_event_at(call["end_at"], call)
+
+    def on_handover(self, call):
+        previous_cell = call["cell"]
+        next_cell = previous_cell + call["direction"]
+        del self.channels[previous_cell][call["channel"]]
+
+        channel = self.handle_handover(next_cell)
+        if self.metrics is not None:
+            self.metrics.on_handover(self.now, previous_cell, next_cell, call, channel is not None)
+        if channel is None:
+            self.dropped_call += 1
+            return
+
+        assert 0 <= channel < 10
+        assert channel not in self.channels[next_cell]
+        call["cell"] = next_cell
+        call["channel"] = channel
+        call["since"] = self.now
+        call["handover"] = True
+        self.channels[next_cell][channel] = call
+
+        self.push_next_event_for_call(call)
+
+    def on_end(self, call):
+        cell = call["cell"]
+        del self.channels[cell][call["channel"]]
+        self.successful_call += 1
+        if self.metrics is not None:
+            self.metrics.on_end(self.now, cell, call)
+
+    def deliver_next_event(self):
+        self.now, _, event = heappop(self.event_queue)
+        # not make this too fancy :)
+        event_type = event["type"]
+        if event_type == "initiate":
+            self.on_initiate(event)
+        elif event_type == "handover":
+            self.on_handover(event)
+        elif event_type == "end":
+            self.on_end(event)
+        else:
+            assert False
+
+    def deliver_next_event_instrumented(self):
+        queue_length = len(self.event_queue)
+        event_type = self.event_queue[0][2]["type"]
+        started = perf_counter()
+        System.deliver_next_event(self)
+        self.instrument.record(event_type, perf_counter() - started, queue_length)
+
+    def is_time_up(self, time_limit):
+        return self.event_queue[0][0] >= time_limit
+
+
+def main(system_cls, scaled_up=SCALED_UP):
+    """Run REPLICATIONS replications of a policy and print the call rates."""
+    global SCALED_UP
+    SCALED_UP = scaled_up
+
+    REPLICATIONS = 20
+    CONFLEVEL = 99
+    two_tail = (1-CONFLEVEL/100)/2
+    blocked_samples = []
+    dropped_samples = []
+    for r in range(REPLICATIONS):
+        instrument = Instrumentation() if INSTRUMENT else None
+        checkpoint = None
+        if CHECKPOINT_DIR is not None:
+            directory = os.path.join(CHECKPOINT_DIR, system_cls.policy_name())
+            os.makedirs(directory, exist_ok=True)
+            checkpoint = os.path.join(directory, f"replication_{r}.ckpt")
+        if checkpoint is not None and os.path.exists(checkpoint):
+            system = load_checkpoint(checkpoint, system_cls, rng, instrument)
+        else:
+            metrics = None
+            if METRICS_DIR is not None:
+                metrics = Metrics(
+                    NUM_STATIONS, os.path.join(METRICS_DIR, f"replication_{r}"), METRICS_INTERVAL
+                )
+            system = system_cls(instrument, metrics)
+        with profiling() if PROFILE else nullcontext():
+            if checkpoint is not None:
+                run_with_checkpoints(system, rng, SIM_DURATION, checkpoint, CHECKPOINT_INTERVAL)
+            else:
+                while not system.is_time_up(SIM_DURATION):
+                    system.deliver_next_event()
+
+        if system.metrics is not None:
+            system.metrics.close(SIM_DURATION)
+
+        total_call = system.successful_call + system.blocked_call + system.dropped_call
+        print(
+            f"total: {total_call} blocked: {system.blocked_call} dropped: {system.dropped_call}"
+        )
+        if instrument is not None:
+            print(instrument.report())
+        blocked_samples.append(system.blocked_call / total_call)
+        dropped_samples.append(system.dropped_call / total_call)
+
+    mena_block_rate = np.mean(blocked_samples) * 100
+    block_conf_inter = 100 * t.ppf(1-two_tail,REPLICATIONS-1) * stat.pstdev(blocked_samples) / np.sqrt(REPLICATIONS)
+    mean_drop_rate = np.mean(dropped_samples) * 100
+    drop_conf_inter = 100 * t.ppf(1-two_tail,REPLICATIONS-1) * stat.pstdev(dropped_samples) / np.sqrt(REPLICATIONS)
+    print(f"blocked call: {mena_block_rate:.2f}% +/- {block_conf_inter:.4f}%")
+    print(f"dropped call: {mean_drop_rate:.2f}% +/- {drop_conf_inter:.4f}%")